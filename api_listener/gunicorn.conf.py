@@ -0,0 +1,12 @@
+# gunicorn settings for the Vestel API
+#   cd api_listener && gunicorn -c gunicorn.conf.py vestel_api:app
+#
+# A single worker, because every request shares one Modbus TCP connection to
+# the charger (the EVC04 only serves one session). Threads let HTTP handling
+# for other requests continue while one request waits on Modbus I/O.
+
+bind = "0.0.0.0:5000"
+workers = 1
+worker_class = "gthread"
+threads = 8
+timeout = 30
@@ -1,52 +1,80 @@
 from flask import Flask, request, jsonify, Response, send_from_directory
-from flask_cors import CORS
-import subprocess
 import json
 import os
+import sys
 from pathlib import Path
 
-app = Flask(__name__)
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(CURRENT_DIR.parent))
 
-# Enable CORS for all origins (can be restricted later for safety)
-CORS(app, resources={r"/*": {"origins": "*"}})
+import vestel  # noqa: E402  (lives in the parent directory)
 
-CURRENT_DIR = Path(__file__).resolve().parent
-VESTEL_SCRIPT = CURRENT_DIR.parent / "vestel.py"
+app = Flask(__name__)
 
-# Ensure static directory exists
-os.makedirs(os.path.join(os.path.dirname(__file__), 'static'), exist_ok=True)
+# CORS origins, comma-separated; defaults to all origins (can be restricted for
+# safety). Set CORS_ORIGINS to an empty string to disable CORS, in which case
+# flask_cors isn't imported at all.
+CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
+if CORS_ORIGINS:
+    from flask_cors import CORS
+    origins = [o.strip() for o in CORS_ORIGINS.split(',')] if CORS_ORIGINS != '*' else '*'
+    CORS(app, resources={r"/*": {"origins": origins}})
+
+# One reader for the whole process; it serializes Modbus access internally
+# and re-reads the INI when it changes
+reader = vestel.VestelReader(vestel.load_config(vestel.DEF_CFG_PATH), config_path=vestel.DEF_CFG_PATH)
+
+# /status and /metrics render the same cached snapshot, so the charger is read
+# at most once per this many seconds whatever the scrape mix (0 disables)
+CACHE_TTL = float(os.environ.get('METRICS_CACHE_TTL', '10'))
+snapshots = vestel.SnapshotCache(reader)
+
+
+def _render_status(snap):
+    # Compact JSON: API clients don't need the CLI's indentation. Bytes go
+    # straight into the response body without a decode/encode round trip
+    return vestel.print_json_bytes(snap, indent=False)
+
+
+def _parse_current(value):
+    """Whole amps from a query string or JSON number, else None (rejects true/false and 16.9)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return None
 
 
 @app.route('/')
 def index():
     """Serve the main web interface."""
-    return send_from_directory('.', 'index.html')
+    return send_from_directory(CURRENT_DIR, 'index.html')
 
 
 @app.route('/status', methods=['GET'])
 def get_status():
     """Return JSON status from the Vestel charger exactly as the script outputs it."""
     try:
-        result = subprocess.run(
-            [VESTEL_SCRIPT, '--format=json'],
-            capture_output=True, text=True, check=True
-        )
-        return Response(result.stdout, mimetype='application/json')
-    except subprocess.CalledProcessError as e:
-        return jsonify({'error': 'Failed to get status', 'details': e.stderr}), 500
+        return Response(_render_status(snapshots.get_snapshot(CACHE_TTL)), mimetype='application/json')
+    except vestel.VestelError as e:
+        return jsonify({'error': 'Failed to get status', 'details': str(e)}), 500
 
 
 @app.route('/metrics', methods=['GET'])
 def get_metrics():
     """Return Prometheus metrics from the Vestel charger."""
     try:
-        result = subprocess.run(
-            [VESTEL_SCRIPT, '--format=prometheus'],
-            capture_output=True, text=True, check=True
-        )
-        return result.stdout, 200, {'Content-Type': 'text/plain'}
-    except subprocess.CalledProcessError as e:
-        return jsonify({'error': 'Failed to read metrics', 'details': e.stderr}), 500
+        snap = snapshots.get_snapshot(CACHE_TTL)
+        return vestel.print_prometheus(snap), 200, {'Content-Type': 'text/plain'}
+    except vestel.VestelError as e:
+        return jsonify({'error': 'Failed to read metrics', 'details': str(e)}), 500
 
 
 @app.route('/set-current', methods=['GET', 'POST'])
@@ -66,35 +94,34 @@ def set_current():
                 return jsonify({'error': 'Missing current value in JSON body'}), 400
             current = data['current']
 
-        # Apply the setting
-        subprocess.run(
-            [VESTEL_SCRIPT, '--format=prometheus', '--set-current', str(current)],
-            capture_output=True, text=True, check=True
-        )
-
-        # Fetch updated status
-        status_result = subprocess.run(
-            [VESTEL_SCRIPT, '--format=json'],
-            capture_output=True, text=True, check=True
-        )
-
-        try:
-            status = json.loads(status_result.stdout)
-            return jsonify({
-                'success': True,
-                'message': f'Current set to {current} successfully',
-                'status': status
-            }), 200
-        except json.JSONDecodeError:
-            return jsonify({
-                'success': True,
-                'message': f'Current set to {current} successfully'
-            }), 200
-
-    except subprocess.CalledProcessError as e:
-        return jsonify({'error': 'Failed to set current', 'details': e.stderr}), 500
+        parsed = _parse_current(current)
+        if parsed is None:
+            return jsonify({'error': f'Invalid current value: {current!r}'}), 400
+        current = parsed
+
+        # Apply the setting; read back only when asked (?verify=1)
+        verify = request.args.get('verify', '').lower() in ('1', 'true', 'yes')
+        written = reader.write_current(current, verify=verify)
+        snapshots.invalidate()
+
+        response = {
+            'success': True,
+            'message': f'Current set to {current} successfully',
+            'current': current
+        }
+        if verify:
+            response['readback'] = {
+                'dynamic_current_a': written['dyn_current_A'],
+                'failsafe_current_a': written['failsafe_A']
+            }
+            response['status'] = json.loads(_render_status(snapshots.get_snapshot(CACHE_TTL)))
+        return jsonify(response), 200
+
+    except vestel.VestelError as e:
+        return jsonify({'error': 'Failed to set current', 'details': str(e)}), 500
 
 
 if __name__ == '__main__':
+    # Development server only; use gunicorn.conf.py for deployments.
     # Bind on all interfaces so Grafana and local web pages can reach it
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -0,0 +1,81 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vestel  # noqa: E402  (lives in the parent directory)
+
+# Exact long options, --opt=value forms, abbreviations, bad types and
+# choices, repeated flags, option-like values and "--"
+ARGV_CASES = [
+    [],
+    ["--ip", "192.168.1.100"],
+    ["--ip=192.168.1.100", "--port=503"],
+    ["--ip", "10.0.0.2", "--port", "502", "--unit", "3", "--base", "1", "--timeout", "0.5"],
+    ["--format", "json"],
+    ["--format=prometheus"],
+    ["--set-current", "16", "--verify"],
+    ["--set-dynamic-current", "10", "--set-failsafe-current", "6"],
+    ["--set-current", "-5"],
+    ["--timeout", "-.5"],
+    ["--serve", "--listen", "127.0.0.1:9200"],
+    ["--config", "/tmp/vestel.ini"],
+    ["--ip", "a", "--ip", "b"],
+    ["--format", "json", "--format", "human"],
+    ["--ip", "-"],
+    ["--ip=-x"],
+    ["--form", "json"],
+    ["--set-cur", "16"],
+    ["--port", "abc"],
+    ["--timeout", "fast"],
+    ["--format", "xml"],
+    ["--base", "2"],
+    ["--verify=1"],
+    ["--ip"],
+    ["--ip", "-x"],
+    ["--ip", "-h"],
+    ["--ip", "--port", "5"],
+    ["--timeout", "-1e5"],
+    ["--"],
+    ["--ip", "1.2.3.4", "--"],
+    ["--", "--ip", "1.2.3.4"],
+    ["extra"],
+]
+
+
+def _argparse_result(argv):
+    """vars() of argparse's namespace, or None if argparse rejects argv"""
+    try:
+        with contextlib.redirect_stderr(io.StringIO()):
+            return vars(vestel._argparser().parse_args(argv))
+    except SystemExit:
+        return None
+
+
+class ParseArgsFastTest(unittest.TestCase):
+    def test_agrees_with_argparse(self):
+        for argv in ARGV_CASES:
+            with self.subTest(argv=argv):
+                fast = vestel._parse_args_fast(argv)
+                if fast is not None:
+                    # Whatever the fast path accepts, argparse must accept identically
+                    self.assertEqual(vars(fast), _argparse_result(argv))
+
+    def test_documented_options_take_fast_path(self):
+        for argv in (["--ip", "192.168.1.100"], ["--format=json"], ["--set-current", "16", "--verify"],
+                     ["--serve", "--listen", ":9101"], ["--set-current", "-5"]):
+            with self.subTest(argv=argv):
+                self.assertIsNotNone(vestel._parse_args_fast(argv))
+
+    def test_falls_back_for_what_it_does_not_parse(self):
+        for argv in (["--form", "json"], ["--port", "abc"], ["--format", "xml"], ["--ip"],
+                     ["--ip", "-x"], ["--ip", "-h"], ["-h"], ["--help"], ["--"]):
+            with self.subTest(argv=argv):
+                self.assertIsNone(vestel._parse_args_fast(argv))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vestel  # noqa: E402  (lives in the parent directory)
+from pymodbus.exceptions import ConnectionException, ModbusIOException  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, registers=None, error=False):
+        self.registers = registers or []
+        self._error = error
+
+    def isError(self):
+        return self._error
+
+
+class FakeOps(dict):
+    """
+    Stand-in for _modbus_ops(): answers every read with registers equal to
+    their address, except for block start addresses listed in `failures`,
+    which get the given response or exception. `hang` starts never answer;
+    their cancellations are counted.
+    """
+
+    def __init__(self, failures=None, hang=()):
+        super().__init__(input=self._read, holding=self._read)
+        self.failures = failures or {}
+        self.hang = set(hang)
+        self.cancelled = []
+
+    async def _read(self, address, count):
+        if address in self.hang:
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                self.cancelled.append(address)
+                raise
+        failure = self.failures.get(address)
+        if isinstance(failure, BaseException):
+            raise failure
+        if failure is not None:
+            return failure
+        return FakeResponse(list(range(address, address + count)))
+
+
+def _fields(start):
+    """Snapshot field names of the READ_PLAN block starting at `start`"""
+    for table, block_start, count, specs in vestel.READ_PLAN:
+        if block_start == start:
+            return {spec.name for spec in specs}
+    raise KeyError(start)
+
+
+def _snapshot(ops):
+    # Bounded, so reads that are never cancelled fail the test instead of hanging it
+    return asyncio.run(asyncio.wait_for(vestel.read_snapshot(ops, 0), 5))
+
+
+class ReadBlocksTest(unittest.TestCase):
+    def assertOnlyBlockMissing(self, snap, start):
+        missing = _fields(start)
+        for name, value in snap._asdict().items():
+            with self.subTest(field=name):
+                if name in missing:
+                    self.assertIn(value, (None, ""))
+                else:
+                    self.assertIsNotNone(value)
+
+    def test_all_blocks_read(self):
+        snap = _snapshot(FakeOps())
+        self.assertEqual(snap.cp_state, 1000)
+        self.assertEqual(snap.dyn_current_A, 5004)
+        self.assertEqual(snap.fault_code, (1006 << 16) | 1007)
+
+    def test_error_response_blanks_only_its_block(self):
+        self.assertOnlyBlockMissing(_snapshot(FakeOps({1502: FakeResponse(error=True)})), 1502)
+
+    def test_generic_exception_blanks_only_its_block(self):
+        self.assertOnlyBlockMissing(_snapshot(FakeOps({400: ValueError("bad frame")})), 400)
+
+    def test_lost_connection_or_no_reply_is_raised_and_cancels_the_rest(self):
+        for exc in (ConnectionException("gone"), ModbusIOException("no reply")):
+            with self.subTest(exc=type(exc).__name__):
+                others = [start for _, start, _, _ in vestel.READ_PLAN if start != 1000]
+                ops = FakeOps({1000: exc}, hang=others)
+                with self.assertRaises(type(exc)):
+                    _snapshot(ops)
+                self.assertEqual(sorted(ops.cancelled), sorted(others))
+
+    def test_every_block_failing_is_raised(self):
+        failures = {start: ValueError(f"bad frame at {start}") for _, start, _, _ in vestel.READ_PLAN}
+        with self.assertRaises(ValueError):
+            _snapshot(FakeOps(failures))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,11 +5,22 @@
 # - Prometheus metrics include label serial="..."
 # - --set-current <amps> writes dynamic charging current (reg 5004)
 # - --set-failsafe-current <amps> writes failsafe current (reg 2000)
+# - Uses orjson for JSON output when installed (optional)
+# - --serve [--listen :9101] keeps the connection open and serves Prometheus metrics over HTTP
+# - Importable: VestelReader + print_* formatters (return strings) for in-process use
 # 
-# OPTIMIZATION: Uses bulk reads to minimize modbus messages from ~20+ to just 4 reads
+# OPTIMIZATION: Uses bulk reads to minimize modbus messages from ~20+ to 6 block reads,
+# all submitted at once (see read_snapshot)
 
-import argparse, configparser, os, sys, json
-from pymodbus.client import ModbusTcpClient
+import configparser, functools, os, socket, sys, struct, threading, time
+from collections import namedtuple
+from operator import attrgetter
+from types import MappingProxyType, SimpleNamespace
+from typing import NamedTuple
+
+# pymodbus (~100 ms to import), asyncio (~50 ms), argparse, inspect, the JSON
+# encoder and http.server are imported where first needed, so code paths that
+# don't use them (--help, errors, other output formats) don't pay for them
 
 # ----------------------- Defaults & CLI -----------------------
 
@@ -26,22 +37,95 @@ def get_default_config_path():
 
 DEF_CFG_PATH = get_default_config_path()
 
-def parse_args():
+# Command-line options as argparse add_argument() arguments; parse_args walks
+# this table itself and only builds the argparse parser for --help or errors
+_OPTIONS = [
+    ("--config", dict(default=DEF_CFG_PATH, help=f"INI config file (default: {DEF_CFG_PATH})")),
+    ("--ip", dict(help="Override IP from config")),
+    ("--port", dict(type=int, help="Override TCP port (default from config)")),
+    ("--unit", dict(type=int, help="Override Modbus unit/slave ID (default from config)")),
+    ("--base", dict(type=int, choices=[0,1], help="Address base (0 or 1)")),
+    ("--timeout", dict(type=float, help="TCP timeout seconds")),
+    ("--format", dict(choices=["human","prometheus","json"], default="human", help="Output format")),
+    ("--set-current", dict(type=int, help="Set both dynamic (reg 5004) and failsafe (reg 2000) charging current (A)")),
+    ("--set-dynamic-current", dict(type=int, help="Set dynamic charging current (A) to reg 5004")),
+    ("--set-failsafe-current", dict(type=int, help="Set failsafe charging current (A) to reg 2000")),
+    ("--verify", dict(action="store_true", help="Read current registers back after writing them")),
+    ("--serve", dict(action="store_true", help="Keep the connection open and serve Prometheus metrics over HTTP")),
+    ("--listen", dict(default=":9101", help="[host]:port for --serve (default: :9101)")),
+]
+
+def _argparser():
+    import argparse
     p = argparse.ArgumentParser(description="Vestel EVC04 Modbus reader/exporter")
-    p.add_argument("--config", default=DEF_CFG_PATH, help=f"INI config file (default: {DEF_CFG_PATH})")
-    p.add_argument("--ip", help="Override IP from config")
-    p.add_argument("--port", type=int, help="Override TCP port (default from config)")
-    p.add_argument("--unit", type=int, help="Override Modbus unit/slave ID (default from config)")
-    p.add_argument("--base", type=int, choices=[0,1], help="Address base (0 or 1)")
-    p.add_argument("--timeout", type=float, help="TCP timeout seconds")
-    p.add_argument("--format", choices=["human","prometheus","json"], default="human", help="Output format")
-    p.add_argument("--set-current", type=int, help="Set both dynamic (reg 5004) and failsafe (reg 2000) charging current (A)")
-    p.add_argument("--set-dynamic-current", type=int, help="Set dynamic charging current (A) to reg 5004")
-    p.add_argument("--set-failsafe-current", type=int, help="Set failsafe charging current (A) to reg 2000")
-    return p.parse_args()
+    for flag, kwargs in _OPTIONS:
+        p.add_argument(flag, **kwargs)
+    return p
 
-def load_config(path):
-    cfg = {"ip": None, "port": 502, "unit": 1, "base": 0, "timeout": 2.0}
+def _is_negative_number(arg):
+    """Same test as argparse's '^-\\d+$|^-\\d*\\.\\d+$' for values that look like negative numbers"""
+    whole, dot, frac = arg[1:].partition(".")
+    if dot:
+        return (not whole or whole.isdigit()) and frac.isdigit()
+    return whole.isdigit()
+
+def _parse_args_fast(argv):
+    """
+    Parse the exact long options of _OPTIONS (--opt value or --opt=value).
+    Returns None for anything else (help, abbreviations, bad values), which
+    argparse then handles with its usual messages.
+    """
+    opts = {flag: kwargs for flag, kwargs in _OPTIONS}
+    ns = {flag[2:].replace("-", "_"): kwargs.get("default", False if kwargs.get("action") else None)
+          for flag, kwargs in _OPTIONS}
+    it = iter(argv)
+    for arg in it:
+        flag, eq, value = arg.partition("=")
+        kwargs = opts.get(flag)
+        if kwargs is None:
+            return None
+        if kwargs.get("action") == "store_true":
+            if eq:
+                return None
+            value = True
+        else:
+            if not eq:
+                value = next(it, None)
+                if value is None or (value[:1] == "-" and len(value) > 1 and not _is_negative_number(value)):
+                    # argparse reads this as the next option ("expected one argument")
+                    return None
+            try:
+                value = kwargs.get("type", str)(value)
+            except ValueError:
+                return None
+            if "choices" in kwargs and value not in kwargs["choices"]:
+                return None
+        ns[flag[2:].replace("-", "_")] = value
+    return SimpleNamespace(**ns)
+
+def parse_args(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    return _parse_args_fast(argv) or _argparser().parse_args(argv)
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(path, mtime):
+    """Parse `path` once per (path, mtime); an edit changes the mtime and so the cache key"""
+    cfg = _parse_config(path)
+    # Read-only all the way down: callers get copies from load_config
+    cfg["intervals"] = MappingProxyType(cfg["intervals"])
+    return MappingProxyType(cfg)
+
+# Seconds between reads of slow-changing fields in long-running mode (API,
+# --serve); a block is re-read when its most frequently refreshed field is due,
+# and fields not listed are read on every snapshot. [intervals] in the INI
+# overrides these per field name.
+DEFAULT_INTERVALS = {"serial": 3600.0, "cp_power_w": 60.0, "phases": 60.0,
+                     "failsafe_A": 30.0, "failsafe_t_s": 30.0}
+
+def _parse_config(path):
+    cfg = {"ip": None, "port": 502, "unit": 1, "base": 0, "timeout": 2.0, "idle_timeout": 60.0,
+           "intervals": dict(DEFAULT_INTERVALS)}
     if os.path.isfile(path):
         cp = configparser.ConfigParser()
         cp.read(path)
@@ -52,6 +136,23 @@ def load_config(path):
             cfg["unit"] = sec.getint("unit", fallback=cfg["unit"])
             cfg["base"] = sec.getint("base", fallback=cfg["base"])
             cfg["timeout"] = sec.getfloat("timeout", fallback=cfg["timeout"])
+            cfg["idle_timeout"] = sec.getfloat("idle_timeout", fallback=cfg["idle_timeout"])
+        if cp.has_section("intervals"):
+            # configparser lower-cases keys; map them back to the field names
+            names = {r.name.lower(): r.name for r in REGISTERS}
+            for key in cp["intervals"]:
+                if key in names:
+                    cfg["intervals"][names[key]] = cp["intervals"].getfloat(key)
+    return cfg
+
+def load_config(path):
+    """Return a fresh copy of the config at `path`, re-parsing only when the file changed"""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    cfg = dict(_load_config_cached(path, mtime))
+    cfg["intervals"] = dict(cfg["intervals"])
     return cfg
 
 def merge_overrides(cfg, args):
@@ -64,59 +165,126 @@ def merge_overrides(cfg, args):
 
 # ----------------------- Modbus helpers -----------------------
 
+def _modbus_exc():
+    """pymodbus.exceptions, imported on first use"""
+    import pymodbus.exceptions
+    return pymodbus.exceptions
+
 def _adj(addr, base):
     return addr - base
 
 def _ok(rr):
     return (rr is not None) and (not rr.isError())
 
-def _call_modbus_method(cli, method_name, address, count=None, value=None, unit=1, **kwargs):
-    """Call modbus method with appropriate unit parameter name and parameters"""
-    method = getattr(cli, method_name)
-    
-    # Prepare base arguments
-    base_args = {'address': address}
-    
-    # Add method-specific arguments
-    if method_name in ['read_input_registers', 'read_holding_registers', 'read_coils', 'read_discrete_inputs']:
-        if count is not None:
-            base_args['count'] = count
-    elif method_name in ['write_register', 'write_coil']:
-        if value is not None:
-            base_args['value'] = value
-    elif method_name in ['write_registers', 'write_coils']:
-        if value is not None:
-            base_args['values'] = value
-    
-    # Try different parameter names based on pymodbus version
-    for param_name in ['device_id', 'slave', 'unit']:
-        try:
-            return method(**base_args, **{param_name: unit}, **kwargs)
-        except TypeError as e:
-            if "unexpected keyword argument" in str(e) and param_name in str(e):
-                continue
-            else:
-                raise
-    
-    # If all else fails, try without any unit parameter (shouldn't happen but just in case)
-    return method(**base_args, **kwargs)
+# Unit keyword of the installed pymodbus ('device_id', 'slave', 'unit', or ""
+# for none); detected on the first call instead of probing with TypeError
+_UNIT_KW = None
 
-def write_hold_u16(cli, addr, value, unit, base):
-    rr = _call_modbus_method(cli, 'write_register', _adj(addr,base), value=value & 0xFFFF, unit=unit)
+def _unit_kw(cli):
+    global _UNIT_KW
+    if _UNIT_KW is None:
+        # All client request methods share the same unit keyword, reads and writes alike
+        import inspect
+        params = inspect.signature(cli.read_input_registers).parameters
+        _UNIT_KW = next((name for name in ('device_id', 'slave', 'unit') if name in params), "")
+    return _UNIT_KW
+
+def _modbus_ops(cli, unit):
+    """
+    Request functions of `cli` for one unit with the unit keyword already
+    bound: {"input": read(address, count), "holding": read(address, count),
+    "write": write(address, value)}. Build once per connection and pass the
+    dict to the helpers below.
+    """
+    unit_kw = _unit_kw(cli)
+    bound = {unit_kw: unit} if unit_kw else {}
+    return {
+        "input": functools.partial(cli.read_input_registers, **bound),
+        "holding": functools.partial(cli.read_holding_registers, **bound),
+        "write": functools.partial(cli.write_register, **bound),
+    }
+
+# The helpers below take the _modbus_ops() of a connected AsyncModbusTcpClient
+# and must be awaited
+
+async def write_hold_u16(ops, addr, value, base):
+    rr = await ops["write"](address=_adj(addr,base), value=value & 0xFFFF)
     return _ok(rr)
 
+async def write_hold_u16_many(ops, pairs, base):
+    """
+    Write [(addr, value), ...] to holding registers, submitting all writes
+    back-to-back on the shared connection with no reads in between.
+    Returns the success flag of each write, in order.
+    """
+    import asyncio
+    return list(await asyncio.gather(*[write_hold_u16(ops, addr, value, base)
+                                       for addr, value in pairs]))
+
+async def read_hold_u16(ops, addr, base):
+    rr = await ops["holding"](address=_adj(addr,base), count=1)
+    return rr.registers[0] if _ok(rr) else None
+
+def _tcp_socket(client):
+    """Best-effort lookup of the socket under an async pymodbus client (layout differs by version)"""
+    for holder in (getattr(client, "ctx", None), getattr(client, "protocol", None), client):
+        transport = getattr(holder, "transport", None)
+        if transport is not None and hasattr(transport, "get_extra_info"):
+            return transport.get_extra_info("socket")
+    return None
+
+# TCP keepalive for long-lived connections: first probe after 30 s idle, then every 10 s
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+
+def _tune_socket(client):
+    """
+    Disable Nagle so small Modbus PDUs go out immediately (asyncio usually does
+    this already) and enable TCP keepalive, so a connection the charger silently
+    dropped is noticed before the next poll rather than by it
+    """
+    sock = _tcp_socket(client)
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Idle/interval knobs are platform specific (Linux names; macOS lacks TCP_KEEPIDLE)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+
+def _clean_str(b):
+    return b.translate(None, b"\x00").decode(errors="ignore").strip()
+
 def read_input_str_from_regs(regs):
-    """Extract string from register array"""
-    be, le = bytearray(), bytearray()
-    for w in regs:
-        hi, lo = (w >> 8) & 0xFF, w & 0xFF
-        be.extend((hi, lo)); le.extend((lo, hi))
-    clean = lambda b: bytes(x for x in b if x != 0).decode(errors="ignore").strip()
-    s_be, s_le = clean(be), clean(le)
-    return s_le if len(s_le) > len(s_be) else s_be
+    """Extract string from register array (whichever byte order yields more text)"""
+    return _str_from_bytes(struct.pack(f">{len(regs)}H", *regs))[0]
+
+def _swap_bytes(be):
+    # Little-endian is the same bytes with each pair swapped: two C-level slice copies
+    le = bytearray(len(be))
+    le[0::2], le[1::2] = be[1::2], be[0::2]
+    return le
+
+def _str_from_bytes(be, order=None):
+    """
+    Like read_input_str_from_regs, for registers already packed big-endian.
+    With order 'be' or 'le' only that byte order is decoded. Returns
+    (text, order that produced it), the order being None for empty text.
+    """
+    if order == "be":
+        return _clean_str(be), order
+    if order == "le":
+        return _clean_str(_swap_bytes(be)), order
+    s_be, s_le = _clean_str(be), _clean_str(_swap_bytes(be))
+    if len(s_le) > len(s_be):
+        return s_le, "le"
+    return s_be, "be" if s_be else None
+
+_PROM_TRANS = str.maketrans({"\\": "\\\\", "\"": "\\\"", "\n": "\\n"})
 
 def prom_escape(s: str) -> str:
-    return s.replace("\\", "\\\\").replace("\"","\\\"").replace("\n","\\n")
+    return s.translate(_PROM_TRANS)
 
 # ----------------------- State maps -----------------------
 
@@ -128,350 +296,899 @@ CAB_STATE= {0:"CableNotConnected",1:"CableConnected_NoVehicle",2:"CableConnected
 
 # ----------------------- OPTIMIZED Snapshot -----------------------
 
-def read_snapshot(cli, unit, base):
+class RegSpec(NamedTuple):
+    """One snapshot field: `width` registers at `addr` in `table` ("input" or "holding")"""
+    name: str
+    addr: int
+    width: int = 1          # 1 = u16, 2 = u32 (high word first); strings use the full width
+    table: str = "input"
+    kind: str = "uint"      # "uint" or "str"
+
+# Register map of everything in a snapshot; block reads are planned from this
+REGISTERS = [
+    # Identity
+    RegSpec("serial", 100, 25, kind="str"),
+    RegSpec("cp_power_w", 400, 2),
+    RegSpec("phases", 404),
+    # States
+    RegSpec("cp_state", 1000),
+    RegSpec("charging_state", 1001),
+    RegSpec("equip_state", 1002),
+    RegSpec("cable_state", 1004),
+    RegSpec("fault_code", 1006, 2),
+    # Electricals
+    RegSpec("i_l1_ma", 1008),
+    RegSpec("i_l2_ma", 1010),
+    RegSpec("i_l3_ma", 1012),
+    RegSpec("v_l1_v", 1014),
+    RegSpec("v_l2_v", 1016),
+    RegSpec("v_l3_v", 1018),
+    RegSpec("p_tot_w", 1020, 2),
+    RegSpec("p_l1_w", 1024, 2),
+    RegSpec("p_l2_w", 1028, 2),
+    RegSpec("p_l3_w", 1032, 2),
+    RegSpec("meter_01kwh", 1036, 2),
+    # Limits
+    RegSpec("sess_max_A", 1100),
+    RegSpec("evse_min_A", 1102),
+    RegSpec("evse_max_A", 1104),
+    RegSpec("cable_max_A", 1106),
+    # Session
+    RegSpec("sess_energy_Wh", 1502, 2),
+    RegSpec("sess_duration_s", 1508, 2),
+    # Settings
+    RegSpec("failsafe_A", 2000, table="holding"),
+    RegSpec("failsafe_t_s", 2002, table="holding"),
+    RegSpec("dyn_current_A", 5004, table="holding"),
+]
+
+MAX_REGS_PER_READ = 125   # Modbus limit for one read request
+
+# Unused registers a block read may span to save a transaction. 64 is just
+# enough to read 1000-1106 in one shot (gap 1038-1099), trading some wasted
+# bandwidth for one fewer round trip.
+DEFAULT_MAX_GAP = 64
+
+def plan_blocks(specs, max_gap=DEFAULT_MAX_GAP):
+    """
+    Greedily merge specs into block reads: a spec joins the previous block if
+    it is in the same table, at most `max_gap` unused registers away and the
+    block stays within MAX_REGS_PER_READ.
+
+    Returns [(table, start, count, (RegSpec, ...)), ...]
+    """
+    blocks = []
+    for spec in sorted(specs, key=lambda r: (r.table, r.addr)):
+        end = spec.addr + spec.width
+        if blocks:
+            table, start, count, members = blocks[-1]
+            if (table == spec.table and spec.addr - (start + count) <= max_gap
+                    and end - start <= MAX_REGS_PER_READ):
+                blocks[-1] = (table, start, max(start + count, end) - start, members + (spec,))
+                continue
+        blocks.append((spec.table, spec.addr, spec.width, (spec,)))
+    return blocks
+
+# With the defaults: 100-124, 400-404, 1000-1106, 1502-1509, 2000-2002, 5004
+READ_PLAN = plan_blocks(REGISTERS)
+
+# Same, but with 1000-1106 split into 1000-1037 and 1100-1106 (7 reads) for
+# links where the 62 skipped registers cost more than a round trip
+SPLIT_READ_PLAN = plan_blocks(REGISTERS, max_gap=4)
+
+PROBE_SAMPLES = 3        # timing rounds per probe; the fastest of each size counts
+PROBE_MAX_AGE = 3600.0   # seconds; a new connection after this long measures again
+
+# Immutable snapshot record with one attribute per REGISTERS entry (s.i_l1_ma, ...);
+# use snap._replace(name=value) to derive an updated copy
+Snapshot = namedtuple("Snapshot", [r.name for r in REGISTERS])
+_FIELD_INDEX = {r.name: i for i, r in enumerate(REGISTERS)}
+
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+
+@functools.lru_cache(maxsize=None)
+def _block_decoder(start, count, specs):
+    """
+    Compile one block's numeric fields into a single big-endian struct (u16 -> H,
+    u32 -> I, unused registers -> pad bytes), so every field of the block comes
+    out of one unpack_from call. Also maps every field to its byte range for
+    strings and short responses. Returns (block packer, field unpacker, field
+    indices, ((index, byte offset, byte end, Struct or None for str), ...)).
+    """
+    fmt, cursor, indices, fields = ">", 0, [], []
+    for spec in specs:
+        off = spec.addr - start
+        i = _FIELD_INDEX[spec.name]
+        fields.append((i, 2 * off, 2 * (off + spec.width),
+                       None if spec.kind == "str" else _U32 if spec.width == 2 else _U16))
+        if spec.kind == "str":
+            continue
+        if off > cursor:
+            fmt += f"{2 * (off - cursor)}x"
+        fmt += "I" if spec.width == 2 else "H"
+        cursor = off + spec.width
+        indices.append(i)
+    return struct.Struct(f">{count}H"), struct.Struct(fmt), indices, tuple(fields)
+
+def _decode_snapshot(plan, blocks):
+    """
+    Build a Snapshot from the register lists (or None for failed reads) of each
+    plan block. pymodbus only hands out registers as a list of ints, so each
+    block is packed back to bytes once and every field, strings included, is
+    decoded from that buffer by offset.
+    """
+    return _decode_blocks(plan, blocks)[0]
+
+def _decode_blocks(plan, blocks, str_order=None):
+    """
+    _decode_snapshot with a known string byte order ('be'/'le', None to try
+    both). Returns (Snapshot, byte order the strings turned out to use or None).
+    """
+    values = [None] * len(REGISTERS)
+    for (table, start, count, specs), regs in zip(plan, blocks):
+        packer, unpacker, indices, fields = _block_decoder(start, count, specs)
+        if regs is None:
+            for i, off, end, fmt in fields:
+                if fmt is None:
+                    values[i] = ""
+            continue
+        complete = len(regs) == count
+        buf = packer.pack(*regs) if complete else struct.pack(f">{len(regs)}H", *regs)
+        if complete and indices:
+            for i, v in zip(indices, unpacker.unpack_from(buf)):
+                values[i] = v
+        for i, off, end, fmt in fields:
+            if fmt is None:
+                values[i], order = _str_from_bytes(buf[off:end], str_order)
+                str_order = str_order or order
+            elif not complete and end <= len(buf):
+                # Short response: decode what is there field by field
+                values[i] = fmt.unpack_from(buf, off)[0]
+    return Snapshot._make(values), str_order
+
+async def read_snapshot(ops, base, plan=READ_PLAN):
     """
     OPTIMIZED: Read all data with minimal modbus queries using bulk reads
-    
+
     Original: ~20+ individual register reads
-    Optimized: 6 bulk reads (aggressive optimization with larger reads):
-      1. Input registers 100-124 (25 regs) - Serial number
-      2. Input registers 400-404 (5 regs) - Power config (cp_power_w is u32, phases is u16)
-      3. Input registers 1000-1106 (107 regs) - States, currents, voltages, powers, meter, limits
-      4. Input registers 1502-1509 (8 regs) - Session energy and duration
-      5. Holding registers 2000-2002 (3 regs) - Failsafe settings
-      6. Holding register 5004 (1 reg) - Dynamic current
-    """
-    s = {}
-    
-    # === BULK READ 1: Serial number (input registers 100-124) ===
-    rr1 = _call_modbus_method(cli, 'read_input_registers', _adj(100, base), 25, unit=unit)
-    if _ok(rr1):
-        s["serial"] = read_input_str_from_regs(rr1.registers)
-    else:
-        s["serial"] = ""
-    
-    # === BULK READ 2: Power config block (input registers 400-404) ===
-    # 400-401: cp_power_w (u32), 404: phases (u16)
-    rr2 = _call_modbus_method(cli, 'read_input_registers', _adj(400, base), 5, unit=unit)
-    if _ok(rr2):
-        regs = rr2.registers
-        # Extract u32 from position 0-1 (addr 400-401)
-        s["cp_power_w"] = (regs[0] << 16) | regs[1]
-        # Extract u16 from position 4 (addr 404)
-        s["phases"] = regs[4] if len(regs) > 4 else None
-    else:
-        s["cp_power_w"] = None
-        s["phases"] = None
-    
-    # === BULK READ 3: MEGA block (input registers 1000-1106) ===
-    # This is aggressive: reading 107 registers in one shot to cover:
-    # - States, fault, currents, voltages, powers, meter (1000-1037)
-    # - Gap with unused registers (1038-1099)
-    # - Current limits (1100-1106)
-    # This trades some wasted bandwidth for fewer transactions
-    rr3 = _call_modbus_method(cli, 'read_input_registers', _adj(1000, base), 107, unit=unit)
-    if _ok(rr3):
-        regs = rr3.registers
-        # States (1000-1006)
-        s["cp_state"] = regs[0]           # 1000
-        s["charging_state"] = regs[1]     # 1001
-        s["equip_state"] = regs[2]        # 1002
-        s["cable_state"] = regs[4]        # 1004
-        # Fault code u32 (1006-1007)
-        s["fault_code"] = (regs[6] << 16) | regs[7]
-        
-        # Currents u16 (1008, 1010, 1012)
-        s["i_l1_ma"] = regs[8]            # 1008
-        s["i_l2_ma"] = regs[10]           # 1010
-        s["i_l3_ma"] = regs[12]           # 1012
-        
-        # Voltages u16 (1014, 1016, 1018)
-        s["v_l1_v"] = regs[14]            # 1014
-        s["v_l2_v"] = regs[16]            # 1016
-        s["v_l3_v"] = regs[18]            # 1018
-        
-        # Powers u32 (1020-1021, 1024-1025, 1028-1029, 1032-1033)
-        s["p_tot_w"] = (regs[20] << 16) | regs[21]    # 1020-1021
-        s["p_l1_w"] = (regs[24] << 16) | regs[25]     # 1024-1025
-        s["p_l2_w"] = (regs[28] << 16) | regs[29]     # 1028-1029
-        s["p_l3_w"] = (regs[32] << 16) | regs[33]     # 1032-1033
-        
-        # Meter reading u32 (1036-1037)
-        s["meter_01kwh"] = (regs[36] << 16) | regs[37]
-        
-        # Current limits (1100-1106) - offset by 100 from start
-        s["sess_max_A"] = regs[100]       # 1100
-        s["evse_min_A"] = regs[102]       # 1102
-        s["evse_max_A"] = regs[104]       # 1104
-        s["cable_max_A"] = regs[106]      # 1106
-    else:
-        # Set all to None if bulk read fails
-        for key in ["cp_state", "charging_state", "equip_state", "cable_state", "fault_code",
-                    "i_l1_ma", "i_l2_ma", "i_l3_ma", "v_l1_v", "v_l2_v", "v_l3_v",
-                    "p_l1_w", "p_l2_w", "p_l3_w", "p_tot_w", "meter_01kwh",
-                    "sess_max_A", "evse_min_A", "evse_max_A", "cable_max_A"]:
-            s[key] = None
-    
-    # === BULK READ 4: Session data (input registers 1502-1509) ===
-    # Reading 8 registers to cover both energy (1502-1503) and duration (1508-1509)
-    rr4 = _call_modbus_method(cli, 'read_input_registers', _adj(1502, base), 8, unit=unit)
-    if _ok(rr4):
-        regs = rr4.registers
-        s["sess_energy_Wh"] = (regs[0] << 16) | regs[1]      # 1502-1503
-        s["sess_duration_s"] = (regs[6] << 16) | regs[7]     # 1508-1509
-    else:
-        s["sess_energy_Wh"] = None
-        s["sess_duration_s"] = None
-    
-    # === BULK READ 5: Failsafe settings (holding registers 2000-2002) ===
-    rr5 = _call_modbus_method(cli, 'read_holding_registers', _adj(2000, base), 3, unit=unit)
-    if _ok(rr5):
-        s["failsafe_A"] = rr5.registers[0]    # 2000
-        s["failsafe_t_s"] = rr5.registers[2]  # 2002
-    else:
-        s["failsafe_A"] = None
-        s["failsafe_t_s"] = None
-    
-    # === BULK READ 6: Dynamic current (holding register 5004) ===
-    rr6 = _call_modbus_method(cli, 'read_holding_registers', _adj(5004, base), 1, unit=unit)
-    if _ok(rr6):
-        s["dyn_current_A"] = rr6.registers[0]  # 5004
-    else:
-        s["dyn_current_A"] = None
-    
-    return s
+    Optimized: one read per block of `plan` (6 with the default plan), all
+    submitted at once with asyncio.gather so they share round trips wherever
+    the client and device pipeline transactions; fields are sliced out of
+    each block by offset.
+
+    Pipelining note: pymodbus releases with the TransactionManager (3.8+)
+    hold a per-client lock for each request/response pair, so there the
+    gathered reads still go out one at a time; older async clients match
+    concurrent responses by transaction ID. Holding blocks 2000-2002 and 5004
+    cannot be merged into one read (3000 registers apart), and bypassing
+    pymodbus to hand-write PDUs to the socket would be too fragile.
+
+    A block the device answers with an error leaves its fields None (strings
+    become ""), like an error response always did. A lost connection, a
+    request without reply, or every block failing, is raised instead.
+    Returns a Snapshot.
+    """
+    return _decode_snapshot(plan, await read_blocks(ops, base, plan))
+
+async def read_blocks(ops, base, plan):
+    """
+    Read the blocks of `plan` concurrently, as read_snapshot does. Returns the
+    register list of each block, or None for a block the device answered with
+    an error. A lost connection or a request without reply is raised at once,
+    cancelling the reads still queued behind it: pymodbus sends them one at a
+    time, so each would otherwise wait out its own timeout.
+    """
+    import asyncio
+    exc = _modbus_exc()
+    tasks = [asyncio.ensure_future(ops[table](address=_adj(start, base), count=count))
+             for table, start, count, _ in plan]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            try:
+                await fut
+            except (exc.ConnectionException, exc.ModbusIOException):
+                raise
+            except Exception:
+                pass  # collected with the results below
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Retrieve every outcome so no task is left with an unread exception
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [rr for rr in results if isinstance(rr, BaseException)]
+    for err in errors:
+        if not isinstance(err, Exception):
+            raise err
+    if errors and len(errors) == len(results):
+        raise errors[0]
+    return [rr.registers if not isinstance(rr, BaseException) and _ok(rr) else None
+            for rr in results]
+
+async def _probe_split_block3(ops, base):
+    """
+    Decide whether splitting block 1000-1106 pays off on this link.
+
+    Times PROBE_SAMPLES rounds of a 10- and a 100-register read, keeping the
+    fastest of each size so one scheduling hiccup can't skew the result, to
+    estimate the per-request cost r and the per-byte cost b
+    (t = r + 2 * count * b). Splits if the extra request is cheaper than the
+    skipped bytes: r < 124 * b. Returns False (keep the single read) if a
+    probe read fails.
+    """
+    read = ops["input"]
+    times = [float("inf"), float("inf")]
+    for _ in range(PROBE_SAMPLES):
+        for k, count in enumerate((10, 100)):
+            t0 = time.perf_counter()
+            rr = await read(address=_adj(1000, base), count=count)
+            times[k] = min(times[k], time.perf_counter() - t0)
+            if not _ok(rr):
+                return False
+    b = max(times[1] - times[0], 0.0) / (2 * 90)
+    r = times[0] - 2 * 10 * b
+    return r < 2 * 62 * b
+
+# ----------------------- Display values -----------------------
+
+def _scaled(v, divisor, ndigits):
+    return round(v / divisor, ndigits) if v is not None else None
+
+def _format_snapshot(s):
+    """
+    Every display-ready value of a snapshot, computed once: scaled units,
+    state names and the raw values they come from. Fields whose read failed
+    stay None (state names become "Unknown") instead of turning into zeros.
+    """
+    phases = s.phases
+    return {
+        "serial": s.serial,
+        "max_power_w": s.cp_power_w,
+        "max_power_kw": _scaled(s.cp_power_w, 1000.0, 2),
+        "phases": None if phases is None else "3-phase" if phases == 1 else "1-phase",
+        "phases_raw": phases,
+        "cp_state": s.cp_state,
+        "cp_state_name": CP_STATE.get(s.cp_state, "Unknown"),
+        "charging_state": s.charging_state,
+        "charging_state_name": CH_STATE.get(s.charging_state, "Unknown"),
+        "equip_state": s.equip_state,
+        "equip_state_name": EQ_STATE.get(s.equip_state, "Unknown"),
+        "cable_state": s.cable_state,
+        "cable_state_name": CAB_STATE.get(s.cable_state, "Unknown"),
+        "fault_code": s.fault_code,
+        "l1_a": _scaled(s.i_l1_ma, 1000.0, 2),
+        "l2_a": _scaled(s.i_l2_ma, 1000.0, 2),
+        "l3_a": _scaled(s.i_l3_ma, 1000.0, 2),
+        "l1_v": s.v_l1_v,
+        "l2_v": s.v_l2_v,
+        "l3_v": s.v_l3_v,
+        "l1_w": s.p_l1_w,
+        "l2_w": s.p_l2_w,
+        "l3_w": s.p_l3_w,
+        "total_w": s.p_tot_w,
+        "total_kw": _scaled(s.p_tot_w, 1000.0, 2),
+        "meter_kwh": _scaled(s.meter_01kwh, 10.0, 1),
+        "evse_min_a": s.evse_min_A,
+        "evse_max_a": s.evse_max_A,
+        "cable_max_a": s.cable_max_A,
+        "session_max_a": s.sess_max_A,
+        "session_energy_wh": s.sess_energy_Wh,
+        "session_energy_kwh": _scaled(s.sess_energy_Wh, 1000.0, 3),
+        "session_duration_s": s.sess_duration_s,
+        "dynamic_current_a": s.dyn_current_A,
+        "failsafe_current_a": s.failsafe_A,
+        "failsafe_timeout_s": s.failsafe_t_s,
+    }
 
 # ----------------------- Human output -----------------------
 
+def _text(v, spec=""):
+    """format(v, spec), or a blank for a value that could not be read"""
+    return "" if v is None else format(v, spec)
+
 def print_human(s):
-    print("== Identity ==")
-    print(f"Serial:              {s['serial']}")
-    print(f"Max Power:           {s.get('cp_power_w')} W ({s.get('cp_power_w', 0)/1000:.2f} kW)")
-    print(f"Phases:              {'3-phase' if s.get('phases')==1 else '1-phase'}")
-    print()
-    print("== States ==")
-    print(f"Chargepoint State:   {CP_STATE.get(s.get('cp_state'), 'Unknown')}")
-    print(f"Charging State:      {CH_STATE.get(s.get('charging_state'), 'Unknown')}")
-    print(f"Equipment State:     {EQ_STATE.get(s.get('equip_state'), 'Unknown')}")
-    print(f"Cable State:         {CAB_STATE.get(s.get('cable_state'), 'Unknown')}")
-    print(f"EVSE Fault Code:     {s.get('fault_code')}")
-    print()
-    print("== Electricals ==")
-    print(f"Current L1:       {s.get('i_l1_ma', 0)/1000:.2f} A")
-    print(f"Voltage L1:       {s.get('v_l1_v')} V")
-    print(f"Current L2:       {s.get('i_l2_ma', 0)/1000:.2f} A")
-    print(f"Voltage L2:       {s.get('v_l2_v')} V")
-    print(f"Current L3:       {s.get('i_l3_ma', 0)/1000:.2f} A")
-    print(f"Voltage L3:       {s.get('v_l3_v')} V")
-    print(f"Active Power Total:  {s.get('p_tot_w', 0)/1000:.2f} kW")
-    print(f"Meter Reading:       {s.get('meter_01kwh', 0)/10:.1f} kWh")
-    print()
-    print("== Limits & Session ==")
-    print(f"EVSE Min/Max Current: {s.get('evse_min_A')} / {s.get('evse_max_A')} A")
-    print(f"Cable Max Current:    {s.get('cable_max_A')} A")
-    print(f"Session Max Current:  {s.get('sess_max_A')} A")
-    print(f"Session Energy:       {s.get('sess_energy_Wh', 0)/1000:.3f} kWh")
-    print(f"Session Duration:     {s.get('sess_duration_s')} s")
-    print()
-    print("== Current Settings ==")
-    print(f"Dynamic Current:     {s.get('dyn_current_A')} A")
-    print(f"Failsafe Current:    {s.get('failsafe_A')} A")
-    print(f"Failsafe Timeout:    {s.get('failsafe_t_s')} s")
-    print()
+    """Return snapshot data as human-readable text"""
+    f = _format_snapshot(s)
+    lines = [
+        "== Identity ==",
+        f"Serial:              {f['serial']}",
+        f"Max Power:           {_text(f['max_power_w'])} W ({_text(f['max_power_kw'], '.2f')} kW)",
+        f"Phases:              {_text(f['phases'])}",
+        "",
+        "== States ==",
+        f"Chargepoint State:   {f['cp_state_name']}",
+        f"Charging State:      {f['charging_state_name']}",
+        f"Equipment State:     {f['equip_state_name']}",
+        f"Cable State:         {f['cable_state_name']}",
+        f"EVSE Fault Code:     {_text(f['fault_code'])}",
+        "",
+        "== Electricals ==",
+        f"Current L1:       {_text(f['l1_a'], '.2f')} A",
+        f"Voltage L1:       {_text(f['l1_v'])} V",
+        f"Current L2:       {_text(f['l2_a'], '.2f')} A",
+        f"Voltage L2:       {_text(f['l2_v'])} V",
+        f"Current L3:       {_text(f['l3_a'], '.2f')} A",
+        f"Voltage L3:       {_text(f['l3_v'])} V",
+        f"Active Power Total:  {_text(f['total_kw'], '.2f')} kW",
+        f"Meter Reading:       {_text(f['meter_kwh'], '.1f')} kWh",
+        "",
+        "== Limits & Session ==",
+        f"EVSE Min/Max Current: {_text(f['evse_min_a'])} / {_text(f['evse_max_a'])} A",
+        f"Cable Max Current:    {_text(f['cable_max_a'])} A",
+        f"Session Max Current:  {_text(f['session_max_a'])} A",
+        f"Session Energy:       {_text(f['session_energy_kwh'], '.3f')} kWh",
+        f"Session Duration:     {_text(f['session_duration_s'])} s",
+        "",
+        "== Current Settings ==",
+        f"Dynamic Current:     {_text(f['dynamic_current_a'])} A",
+        f"Failsafe Current:    {_text(f['failsafe_current_a'])} A",
+        f"Failsafe Timeout:    {_text(f['failsafe_timeout_s'])} s",
+        "",
+    ]
+    return "\n".join(lines) + "\n"
 
 # ----------------------- Prometheus output -----------------------
 
-def print_prometheus(s):
-    """Output snapshot data in Prometheus exposition format"""
-    serial = prom_escape(s["serial"])
-    seen_metrics = set()
-    
-    def output_metric(name, value, help_text, metric_type="gauge", extra_labels=""):
-        """Helper to output a Prometheus metric with proper formatting"""
-        if value is None:
-            return
-        
-        # Only print TYPE and HELP once per metric name
-        if name not in seen_metrics:
-            seen_metrics.add(name)
-            print(f"# HELP {name} {help_text}")
-            print(f"# TYPE {name} {metric_type}")
-            print(f'{name}{{serial="{serial}"{extra_labels}}} {value}')
-    
+def _field(key, divisor=None):
+    """Getter for a snapshot field, optionally scaled (None stays None)"""
+    get = attrgetter(key)
+    if divisor is None:
+        return get
+    def scaled(s):
+        v = get(s)
+        return v / divisor if v is not None else None
+    return scaled
+
+def _prom_family(name, help_text, samples, metric_type="gauge"):
+    """
+    One metric family: static HELP/TYPE header plus (template, getter) per
+    series, where samples is [(labels, getter)]. Only {serial} and {value}
+    vary per scrape.
+    """
+    header = f"# HELP {name} {help_text}\n# TYPE {name} {metric_type}\n"
+    return (header, [(name + '{{serial="{serial}"' + labels + '}} {value}\n', get)
+                     for labels, get in samples])
+
+def _prom_gauge(name, help_text, key, divisor=None):
+    return _prom_family(name, help_text, [("", _field(key, divisor))])
+
+def _prom_per_phase(name, help_text, key_fmt, divisor=None):
+    return _prom_family(name, help_text, [(f',phase="{n}"', _field(key_fmt.format(phase=f"l{n}"), divisor))
+                                          for n in (1, 2, 3)])
+
+# (header, [(template, getter), ...]) per metric family, built once at import
+_PROM_FAMILIES = [
     # Identity metrics
-    output_metric("vestel_max_power_watts", s.get("cp_power_w"), "Maximum power in watts")
-    output_metric("vestel_phases", s.get("phases"), "Phase configuration (0=1-phase, 1=3-phase)")
-    
+    _prom_gauge("vestel_max_power_watts", "Maximum power in watts", "cp_power_w"),
+    _prom_gauge("vestel_phases", "Phase configuration (0=1-phase, 1=3-phase)", "phases"),
+
     # State metrics
-    output_metric("vestel_chargepoint_state", s.get("cp_state"), "Chargepoint state")
-    output_metric("vestel_charging_state", s.get("charging_state"), "Charging state")
-    output_metric("vestel_equipment_state", s.get("equip_state"), "Equipment state")
-    output_metric("vestel_cable_state", s.get("cable_state"), "Cable state")
-    output_metric("vestel_fault_code", s.get("fault_code"), "EVSE fault code")
-    
+    _prom_gauge("vestel_chargepoint_state", "Chargepoint state", "cp_state"),
+    _prom_gauge("vestel_charging_state", "Charging state", "charging_state"),
+    _prom_gauge("vestel_equipment_state", "Equipment state", "equip_state"),
+    _prom_gauge("vestel_cable_state", "Cable state", "cable_state"),
+    _prom_gauge("vestel_fault_code", "EVSE fault code", "fault_code"),
+
     # Electrical measurements
-    for phase, phase_num in [("l1", 1), ("l2", 2), ("l3", 3)]:
-        current_ma = s.get(f"i_{phase}_ma")
-        voltage_v = s.get(f"v_{phase}_v")
-        power_w = s.get(f"p_{phase}_w")
-        
-        if current_ma is not None:
-            output_metric("vestel_current_amperes", current_ma / 1000.0, 
-                         "Current in amperes per phase", extra_labels=f',phase="{phase_num}"')
-        if voltage_v is not None:
-            output_metric("vestel_voltage_volts", voltage_v, 
-                         "Voltage in volts per phase", extra_labels=f',phase="{phase_num}"')
-        if power_w is not None:
-            output_metric("vestel_power_watts", power_w, 
-                         "Power in watts per phase", extra_labels=f',phase="{phase_num}"')
-    
-    output_metric("vestel_total_power_watts", s.get("p_tot_w"), "Total active power in watts")
-    output_metric("vestel_meter_reading_kwh", 
-                  s.get("meter_01kwh") / 10.0 if s.get("meter_01kwh") is not None else None, 
-                  "Meter reading in kWh")
-    
+    _prom_per_phase("vestel_current_amperes", "Current in amperes per phase", "i_{phase}_ma", 1000.0),
+    _prom_per_phase("vestel_voltage_volts", "Voltage in volts per phase", "v_{phase}_v"),
+    _prom_per_phase("vestel_power_watts", "Power in watts per phase", "p_{phase}_w"),
+    _prom_gauge("vestel_total_power_watts", "Total active power in watts", "p_tot_w"),
+    _prom_gauge("vestel_meter_reading_kwh", "Meter reading in kWh", "meter_01kwh", 10.0),
+
     # Current limits
-    output_metric("vestel_evse_min_current_amperes", s.get("evse_min_A"), "EVSE minimum current in amperes")
-    output_metric("vestel_evse_max_current_amperes", s.get("evse_max_A"), "EVSE maximum current in amperes")
-    output_metric("vestel_cable_max_current_amperes", s.get("cable_max_A"), "Cable maximum current in amperes")
-    output_metric("vestel_session_max_current_amperes", s.get("sess_max_A"), "Session maximum current in amperes")
-    
+    _prom_gauge("vestel_evse_min_current_amperes", "EVSE minimum current in amperes", "evse_min_A"),
+    _prom_gauge("vestel_evse_max_current_amperes", "EVSE maximum current in amperes", "evse_max_A"),
+    _prom_gauge("vestel_cable_max_current_amperes", "Cable maximum current in amperes", "cable_max_A"),
+    _prom_gauge("vestel_session_max_current_amperes", "Session maximum current in amperes", "sess_max_A"),
+
     # Session data
-    output_metric("vestel_session_energy_wh", s.get("sess_energy_Wh"), "Session energy in Wh")
-    output_metric("vestel_session_duration_seconds", s.get("sess_duration_s"), "Session duration in seconds")
-    
+    _prom_gauge("vestel_session_energy_wh", "Session energy in Wh", "sess_energy_Wh"),
+    _prom_gauge("vestel_session_duration_seconds", "Session duration in seconds", "sess_duration_s"),
+
     # Current settings
-    output_metric("vestel_dynamic_current_amperes", s.get("dyn_current_A"), "Dynamic current setting in amperes")
-    output_metric("vestel_failsafe_current_amperes", s.get("failsafe_A"), "Failsafe current setting in amperes")
-    output_metric("vestel_failsafe_timeout_seconds", s.get("failsafe_t_s"), "Failsafe timeout in seconds")
+    _prom_gauge("vestel_dynamic_current_amperes", "Dynamic current setting in amperes", "dyn_current_A"),
+    _prom_gauge("vestel_failsafe_current_amperes", "Failsafe current setting in amperes", "failsafe_A"),
+    _prom_gauge("vestel_failsafe_timeout_seconds", "Failsafe timeout in seconds", "failsafe_t_s"),
+]
+
+def print_prometheus(s):
+    """Return snapshot data in Prometheus exposition format"""
+    serial = prom_escape(s.serial)
+    parts = []
+    for header, samples in _PROM_FAMILIES:
+        lines = []
+        for template, get in samples:
+            value = get(s)
+            if value is not None:
+                lines.append(template.format(serial=serial, value=value))
+        if lines:
+            # HELP/TYPE once per family, only when it has at least one series
+            parts.append(header)
+            parts.extend(lines)
+    return "".join(parts)
 
 # ----------------------- JSON output -----------------------
 
-def print_json(s):
-    """Output snapshot data as JSON with enhanced/computed fields"""
+@functools.lru_cache(maxsize=None)
+def _json_encoder():
+    """dumps(obj, indent) -> bytes, with orjson when installed, stdlib json otherwise"""
+    try:
+        import orjson  # optional, faster JSON encoding
+    except ImportError:
+        import json
+        # ensure_ascii=False: raw UTF-8 like orjson, so both encoders give the same bytes
+        def dumps(obj, indent):
+            if indent:
+                return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+            return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+        return dumps
+    def dumps(obj, indent):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return dumps
+
+def _json_dumps(obj, indent):
+    """Serialize to UTF-8 bytes"""
+    return _json_encoder()(obj, indent)
+
+def print_json_bytes(s, indent=True):
+    """
+    Like print_json, but returns the encoded bytes as the JSON encoder made
+    them, for callers that write to a binary stream or HTTP body
+    """
+    f = _format_snapshot(s)
     output = {
         "identity": {
-            "serial": s["serial"],
-            "max_power_w": s.get("cp_power_w"),
-            "max_power_kw": round(s["cp_power_w"] / 1000.0, 2) if s.get("cp_power_w") else None,
-            "phases": "3-phase" if s.get("phases") == 1 else "1-phase",
-            "phases_raw": s.get("phases")
+            "serial": f["serial"],
+            "max_power_w": f["max_power_w"],
+            "max_power_kw": f["max_power_kw"],
+            "phases": f["phases"],
+            "phases_raw": f["phases_raw"]
         },
         "states": {
             "chargepoint": {
-                "code": s.get("cp_state"),
-                "name": CP_STATE.get(s["cp_state"], "Unknown")
+                "code": f["cp_state"],
+                "name": f["cp_state_name"]
             },
             "charging": {
-                "code": s.get("charging_state"),
-                "name": CH_STATE.get(s["charging_state"], "Unknown")
+                "code": f["charging_state"],
+                "name": f["charging_state_name"]
             },
             "equipment": {
-                "code": s.get("equip_state"),
-                "name": EQ_STATE.get(s["equip_state"], "Unknown")
+                "code": f["equip_state"],
+                "name": f["equip_state_name"]
             },
             "cable": {
-                "code": s.get("cable_state"),
-                "name": CAB_STATE.get(s["cable_state"], "Unknown")
+                "code": f["cable_state"],
+                "name": f["cable_state_name"]
             },
-            "fault_code": s.get("fault_code")
+            "fault_code": f["fault_code"]
         },
         "electrical": {
             "current": {
-                "l1_a": round(s["i_l1_ma"] / 1000.0, 2) if s.get("i_l1_ma") is not None else None,
-                "l2_a": round(s["i_l2_ma"] / 1000.0, 2) if s.get("i_l2_ma") is not None else None,
-                "l3_a": round(s["i_l3_ma"] / 1000.0, 2) if s.get("i_l3_ma") is not None else None
+                "l1_a": f["l1_a"],
+                "l2_a": f["l2_a"],
+                "l3_a": f["l3_a"]
             },
             "voltage": {
-                "l1_v": s.get("v_l1_v"),
-                "l2_v": s.get("v_l2_v"),
-                "l3_v": s.get("v_l3_v")
+                "l1_v": f["l1_v"],
+                "l2_v": f["l2_v"],
+                "l3_v": f["l3_v"]
             },
             "power": {
-                "l1_w": s.get("p_l1_w"),
-                "l2_w": s.get("p_l2_w"),
-                "l3_w": s.get("p_l3_w"),
-                "total_w": s.get("p_tot_w"),
-                "total_kw": round(s["p_tot_w"] / 1000.0, 2) if s.get("p_tot_w") is not None else None
+                "l1_w": f["l1_w"],
+                "l2_w": f["l2_w"],
+                "l3_w": f["l3_w"],
+                "total_w": f["total_w"],
+                "total_kw": f["total_kw"]
             },
-            "meter_reading_kwh": round(s["meter_01kwh"] / 10.0, 1) if s.get("meter_01kwh") is not None else None
+            "meter_reading_kwh": f["meter_kwh"]
         },
         "limits": {
-            "evse_min_a": s.get("evse_min_A"),
-            "evse_max_a": s.get("evse_max_A"),
-            "cable_max_a": s.get("cable_max_A"),
-            "session_max_a": s.get("sess_max_A")
+            "evse_min_a": f["evse_min_a"],
+            "evse_max_a": f["evse_max_a"],
+            "cable_max_a": f["cable_max_a"],
+            "session_max_a": f["session_max_a"]
         },
         "session": {
-            "energy_wh": s.get("sess_energy_Wh"),
-            "energy_kwh": round(s["sess_energy_Wh"] / 1000.0, 3) if s.get("sess_energy_Wh") is not None else None,
-            "duration_s": s.get("sess_duration_s")
+            "energy_wh": f["session_energy_wh"],
+            "energy_kwh": f["session_energy_kwh"],
+            "duration_s": f["session_duration_s"]
         },
         "settings": {
-            "dynamic_current_a": s.get("dyn_current_A"),
-            "failsafe_current_a": s.get("failsafe_A"),
-            "failsafe_timeout_s": s.get("failsafe_t_s")
+            "dynamic_current_a": f["dynamic_current_a"],
+            "failsafe_current_a": f["failsafe_current_a"],
+            "failsafe_timeout_s": f["failsafe_timeout_s"]
         }
     }
     
-    print(json.dumps(output, indent=2))
+    return _json_dumps(output, indent) + b"\n"
 
-# ----------------------- Main -----------------------
+def print_json(s, indent=True):
+    """Return snapshot data as JSON with enhanced/computed fields (compact if indent=False)"""
+    return print_json_bytes(s, indent).decode()
 
-def main():
-    args = parse_args()
-    cfg = merge_overrides(load_config(args.config), args)
-    if not cfg["ip"]:
-        sys.exit("ERROR: IP not set (use --ip or config file).")
+# ----------------------- In-process reader -----------------------
+
+class VestelError(Exception):
+    """Raised by VestelReader when the charger cannot be reached or a write fails"""
+
+RECONNECT_BACKOFF_MAX = 60.0   # seconds
+
+# Upper bound on one reader call (connect, reads, writes) while it holds the
+# reader lock; kept well under gunicorn's 30 s worker timeout
+CALL_TIMEOUT_MAX = 20.0   # seconds
 
-    client = ModbusTcpClient(host=cfg["ip"], port=cfg["port"], timeout=cfg["timeout"])
-    if not client.connect():
-        sys.exit(f"ERROR: Cannot connect to {cfg['ip']}:{cfg['port']}")
+class VestelReader:
+    """
+    In-process access to one charger for long-lived callers (e.g. the Flask API).
+
+    Keeps one AsyncModbusTcpClient open between calls, driven by a private
+    event loop thread, so snapshot block reads can be issued concurrently
+    while callers keep a plain blocking API. Modbus TCP on the EVC04 is
+    single-session, so all calls are serialized through one lock; a reader
+    can be shared between threads. A kept-open connection that dropped is
+    re-established once per call (failed connects back off exponentially);
+    a request without reply is not retried, and no call takes longer than
+    CALL_TIMEOUT_MAX. TCP keepalive detects dead idle connections, and the
+    socket is closed after cfg["idle_timeout"] seconds without traffic.
+
+    With `config_path`, the INI is re-checked before each call (cheap while
+    its mtime is unchanged) and an edited config takes effect without a
+    restart.
+
+    Blocks whose fields all have a refresh interval (cfg["intervals"]) are
+    reused from earlier snapshots until the shortest of those intervals has
+    passed; writes and config changes drop the reused blocks.
+
+    With `probe_link` (the default), the first connect times a few probe reads
+    to choose between READ_PLAN and SPLIT_READ_PLAN, and a reconnect more than
+    PROBE_MAX_AGE later measures again; one-shot callers that
+    read a single snapshot should pass False and keep READ_PLAN.
+    """
+
+    def __init__(self, cfg, config_path=None, probe_link=True):
+        self.cfg = cfg
+        self.config_path = config_path
+        self.probe_link = probe_link
+        # Whether snapshots use SPLIT_READ_PLAN, and when _probe_split_block3 last decided it
+        self._split_block3 = False
+        self._probed_at = None
+        # Byte order of the charger's strings ('be'/'le'), settled by the first
+        # non-empty serial; later snapshots decode only that order
+        self._str_order = None
+        self._lock = threading.RLock()
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._ops = None    # _modbus_ops() of _client
+        self._idle_timer = None
+        self._last_used = 0.0
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._blocks = {}   # (table, start, count) -> (monotonic read time, registers)
+
+    def _run(self, coro):
+        """Run coro on the reader's event loop thread and wait for its result"""
+        import asyncio
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="vestel-modbus", daemon=True)
+            self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _get_client(self):
+        """Return the shared client, connecting on first use (runs on the loop)"""
+        if self._client is None:
+            cfg = self.cfg
+            if not cfg["ip"]:
+                raise VestelError("IP not set (use --ip or config file).")
+            now = time.monotonic()
+            if now < self._retry_at:
+                # Fail fast instead of hammering an unreachable charger
+                raise VestelError(f"Cannot connect to {cfg['ip']}:{cfg['port']} "
+                                  f"(next attempt in {self._retry_at - now:.0f} s)")
+            from pymodbus.client import AsyncModbusTcpClient
+            client = AsyncModbusTcpClient(host=cfg["ip"], port=cfg["port"], timeout=cfg["timeout"])
+            if not await client.connect():
+                client.close()
+                # Exponential backoff between failed connects: 1, 2, 4, ... RECONNECT_BACKOFF_MAX s
+                self._backoff = min(self._backoff * 2, RECONNECT_BACKOFF_MAX) if self._backoff else 1.0
+                self._retry_at = now + self._backoff
+                raise VestelError(f"Cannot connect to {cfg['ip']}:{cfg['port']}")
+            self._backoff = self._retry_at = 0.0
+            _tune_socket(client)
+            self._client = client
+            self._ops = _modbus_ops(client, cfg["unit"])
+            if self.probe_link and (self._probed_at is None
+                                    or time.monotonic() - self._probed_at >= PROBE_MAX_AGE):
+                self._split_block3 = await _probe_split_block3(self._ops, cfg["base"])
+                self._probed_at = time.monotonic()
+        return self._client
+
+    def _disconnect(self):
+        # The client belongs to the loop, so the close itself is scheduled there
+        if self._client is not None:
+            self._loop.call_soon_threadsafe(self._client.close)
+            self._client = self._ops = None
+
+    def _arm_idle_timer(self):
+        timeout = self.cfg.get("idle_timeout")
+        if not timeout or self._idle_timer is not None:
+            return
+        self._idle_timer = threading.Timer(timeout, self._idle_close)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
 
+    def _idle_close(self):
+        with self._lock:
+            self._idle_timer = None
+            if self._client is None:
+                return
+            remaining = self.cfg["idle_timeout"] - (time.monotonic() - self._last_used)
+            if remaining > 0:
+                # Used since the timer was armed; check again later
+                self._idle_timer = threading.Timer(remaining, self._idle_close)
+                self._idle_timer.daemon = True
+                self._idle_timer.start()
+            else:
+                self._disconnect()
+
+    def _refresh_config(self):
+        """Pick up config file edits, dropping the connection if they changed (lock must be held)"""
+        if self.config_path is None:
+            return
+        cfg = load_config(self.config_path)
+        if cfg != self.cfg:
+            self._disconnect()
+            self.cfg = cfg
+            self._backoff = self._retry_at = 0.0
+            self._blocks.clear()
+            # Possibly a different link and device; measure and detect again
+            self._split_block3, self._probed_at = False, None
+            self._str_order = None
+
+    async def _with_reconnect(self, fn):
+        exc = _modbus_exc()
+        reused = self._client is not None
+        try:
+            await self._get_client()
+            return await fn(self._ops)
+        except exc.ConnectionException:
+            # A kept-open connection the charger dropped: connect once more and
+            # retry. A fresh connection failing is not retried.
+            self._disconnect()
+            if not reused:
+                raise
+        except exc.ModbusIOException:
+            # No reply within the timeout: retrying would only wait it out again
+            self._disconnect()
+            raise
+        await self._get_client()
+        return await fn(self._ops)
+
+    async def _bounded(self, fn):
+        import asyncio
+        return await asyncio.wait_for(self._with_reconnect(fn), CALL_TIMEOUT_MAX)
+
+    def _call(self, fn):
+        """Run coroutine function fn(ops) under the lock, reconnecting once if the connection dropped"""
+        import asyncio
+        with self._lock:
+            self._refresh_config()
+            try:
+                return self._run(self._bounded(fn))
+            except _modbus_exc().ModbusException as e:
+                self._disconnect()
+                raise VestelError(str(e)) from e
+            except asyncio.TimeoutError as e:
+                self._disconnect()
+                raise VestelError(f"No complete reply from {self.cfg['ip']}:{self.cfg['port']} "
+                                  f"within {CALL_TIMEOUT_MAX:.0f} s") from e
+            finally:
+                self._last_used = time.monotonic()
+                self._arm_idle_timer()
+
+    def close(self):
+        """Close the connection and stop the idle timer and event loop thread"""
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            if self._loop is not None:
+                self._disconnect()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+                self._loop = self._thread = None
+
+    def snapshot(self):
+        """Read all registers (slow-changing blocks only when due) and return a Snapshot"""
+        with self._lock:
+            # Refresh first, so an edited [intervals] already applies to this snapshot
+            self._refresh_config()
+            intervals = self.cfg.get("intervals") or {}
+            plan = SPLIT_READ_PLAN if self._split_block3 else READ_PLAN
+            now = time.monotonic()
+            due = []
+            for block in plan:
+                table, start, count, specs = block
+                interval = min(intervals.get(spec.name, 0) for spec in specs)
+                cached = self._blocks.get((table, start, count))
+                if cached is None or now - cached[0] >= interval:
+                    due.append(block)
+            # Nothing due: answer from the reused blocks without touching the connection
+            if due:
+                results = self._call(lambda ops: read_blocks(ops, self.cfg["base"], due))
+                for (table, start, count, _), regs in zip(due, results):
+                    if regs is None:
+                        self._blocks.pop((table, start, count), None)
+                    else:
+                        self._blocks[table, start, count] = (now, regs)
+            blocks = [(self._blocks.get((table, start, count)) or (0, None))[1]
+                      for table, start, count, _ in plan]
+            snap, self._str_order = _decode_blocks(plan, blocks, self._str_order)
+            return snap
+
+    def write_current(self, amps, verify=False, dynamic=True, failsafe=True):
+        """
+        Set dynamic (5004) and/or failsafe (2000) current.
+
+        Returns the new values keyed like the Snapshot fields (dyn_current_A,
+        failsafe_A). A successful write means the register now holds `amps`,
+        so the written value is returned as-is; verify=True reads it back.
+        """
+        targets = []
+        if dynamic:
+            targets.append(("dyn_current_A", 5004, "dynamic"))
+        if failsafe:
+            targets.append(("failsafe_A", 2000, "failsafe"))
+
+        async def write(ops):
+            base = self.cfg["base"]
+            oks = await write_hold_u16_many(ops, [(addr, amps) for _, addr, _ in targets], base)
+            for (_, addr, label), ok in zip(targets, oks):
+                if not ok:
+                    raise VestelError(f"failed writing {amps} A to {label} current register {addr}")
+            if not verify:
+                return {name: amps for name, _, _ in targets}
+            return {name: await read_hold_u16(ops, addr, base) for name, addr, _ in targets}
+
+        with self._lock:
+            try:
+                return self._call(write)
+            finally:
+                self._blocks.clear()
+
+class SnapshotCache:
+    """
+    Shares one snapshot between callers that render it differently
+    (e.g. /status as JSON and /metrics as Prometheus text), so the charger
+    is read at most once per max_age_s regardless of which endpoint asks.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._lock = threading.Lock()
+        self._snap = None
+        self._taken = 0.0
+
+    def get_snapshot(self, max_age_s):
+        """Return a snapshot no older than max_age_s seconds, reading the charger if needed"""
+        with self._lock:
+            if self._snap is None or time.monotonic() - self._taken >= max_age_s:
+                self._snap = self.reader.snapshot()
+                self._taken = time.monotonic()
+            return self._snap
+
+    def invalidate(self):
+        with self._lock:
+            self._snap = None
+
+# ----------------------- Main -----------------------
+
+FORMATTERS = {"human": print_human, "prometheus": print_prometheus, "json": print_json}
+
+def run(cfg, *, fmt="human", set_current=None, set_dynamic_current=None,
+        set_failsafe_current=None, verify=False):
+    """
+    Read the charger, apply any requested current changes and return the
+    output text in format `fmt`. Raises VestelError on failure.
+    """
+    reader = VestelReader(cfg, probe_link=False)
+    out = []
     try:
-        snap = read_snapshot(client, cfg["unit"], cfg["base"])
+        snap = reader.snapshot()
 
-        if args.set_current is not None:
-            desired = args.set_current
+        if set_current is not None:
             # Set both dynamic and failsafe current
-            ok_dynamic = write_hold_u16(client, 5004, desired, cfg["unit"], cfg["base"])
-            ok_failsafe = write_hold_u16(client, 2000, desired, cfg["unit"], cfg["base"])
-            if not ok_dynamic: 
-                sys.exit(f"ERROR: failed writing {desired} A to dynamic current register 5004")
-            if not ok_failsafe:
-                sys.exit(f"ERROR: failed writing {desired} A to failsafe current register 2000")
-            # Re-read to confirm
-            rr_dyn = _call_modbus_method(client, 'read_holding_registers', _adj(5004, cfg["base"]), 1, unit=cfg["unit"])
-            rr_fail = _call_modbus_method(client, 'read_holding_registers', _adj(2000, cfg["base"]), 1, unit=cfg["unit"])
-            snap["dyn_current_A"] = rr_dyn.registers[0] if _ok(rr_dyn) else None
-            snap["failsafe_A"] = rr_fail.registers[0] if _ok(rr_fail) else None
-            print(f"Set both dynamic and failsafe current → {snap['dyn_current_A']} A / {snap['failsafe_A']} A")
-
-        if args.set_dynamic_current is not None:
-            desired = args.set_dynamic_current
-            ok = write_hold_u16(client, 5004, desired, cfg["unit"], cfg["base"])
-            if not ok: sys.exit(f"ERROR: failed writing {desired} A to 5004")
-            rr = _call_modbus_method(client, 'read_holding_registers', _adj(5004, cfg["base"]), 1, unit=cfg["unit"])
-            snap["dyn_current_A"] = rr.registers[0] if _ok(rr) else None
-            print(f"Set dynamic current → {snap['dyn_current_A']} A")
-
-        if args.set_failsafe_current is not None:
-            desired = args.set_failsafe_current
-            ok = write_hold_u16(client, 2000, desired, cfg["unit"], cfg["base"])
-            if not ok: sys.exit(f"ERROR: failed writing {desired} A to 2000")
-            rr = _call_modbus_method(client, 'read_holding_registers', _adj(2000, cfg["base"]), 1, unit=cfg["unit"])
-            snap["failsafe_A"] = rr.registers[0] if _ok(rr) else None
-            print(f"Set failsafe current → {snap['failsafe_A']} A")
-
-        if args.format == "prometheus":
-            print_prometheus(snap)
-        elif args.format == "json":
-            print_json(snap)
-        else:
-            print_human(snap)
+            snap = snap._replace(**reader.write_current(set_current, verify=verify))
+            out.append(f"Set both dynamic and failsafe current → {snap.dyn_current_A} A / {snap.failsafe_A} A\n")
 
+        if set_dynamic_current is not None:
+            snap = snap._replace(**reader.write_current(set_dynamic_current, verify=verify, failsafe=False))
+            out.append(f"Set dynamic current → {snap.dyn_current_A} A\n")
+
+        if set_failsafe_current is not None:
+            snap = snap._replace(**reader.write_current(set_failsafe_current, verify=verify, dynamic=False))
+            out.append(f"Set failsafe current → {snap.failsafe_A} A\n")
     finally:
-        client.close()
+        reader.close()
+
+    out.append(FORMATTERS[fmt](snap))
+    return "".join(out)
+
+def parse_listen(listen):
+    """Split a --listen '[host]:port' into (host, port); raises ValueError if malformed"""
+    host, sep, port = listen.rpartition(":")
+    if not sep or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"invalid --listen {listen!r} (expected [host]:port)")
+    return host, int(port)
+
+def serve(cfg, listen):
+    """
+    Daemon mode: keep one connection to the charger and answer every HTTP GET
+    of / or /metrics with a fresh snapshot in Prometheus format. Raises
+    ValueError for a malformed `listen` and OSError if it can't be bound.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    host, port = parse_listen(listen)
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            try:
+                body, status = print_prometheus(reader.snapshot()).encode(), 200
+            except VestelError as e:
+                body, status = f"ERROR: {e}\n".encode(), 503
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # one line per scrape is just noise
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    # Only once bound, so a failed bind leaves nothing to clean up
+    reader = VestelReader(cfg)
+    print(f"Serving metrics for {cfg['ip']}:{cfg['port']} on http://{host or '0.0.0.0'}:{port}/metrics", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        reader.close()
+
+def main(argv=None):
+    args = parse_args(argv)
+    cfg = merge_overrides(load_config(args.config), args)
+    if not cfg["ip"]:
+        sys.exit("ERROR: IP not set (use --ip or config file).")
+
+    if args.serve:
+        try:
+            parse_listen(args.listen)
+        except ValueError as e:
+            sys.exit(f"ERROR: {e}")
+        try:
+            serve(cfg, args.listen)
+        except OSError as e:
+            sys.exit(f"ERROR: cannot listen on {args.listen}: {e.strerror or e}")
+        return
+
+    try:
+        sys.stdout.write(run(cfg, fmt=args.format,
+                             set_current=args.set_current,
+                             set_dynamic_current=args.set_dynamic_current,
+                             set_failsafe_current=args.set_failsafe_current,
+                             verify=args.verify))
+    except VestelError as e:
+        sys.exit(f"ERROR: {e}")
 
 if __name__ == "__main__":
     main()